@@ -0,0 +1,73 @@
+# bench/check_index.py
+# 檢查 ingredient_index.py 存在 SQLite 檔案時的行為：移除 (prune / discard) 的食譜在重新啟動、
+# 或其他 worker 讀入新資料後都不會再出現，多個 worker 寫入的食譜彼此都看得到。
+# 修改索引的持久化邏輯後執行：
+#     python bench/check_index.py
+# 有任何檢查失敗時列出並以狀態碼 1 結束。
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingredient_index import IngredientIndex    # noqa: E402
+from store import SQLiteRecipeStore             # noqa: E402
+
+
+def _recipe(n, ingredients="雞肉、洋蔥"):
+    return {
+        "title": f"食譜 {n}",
+        "original_url": f"https://icook.tw/recipes/{n}",
+        "image_url": "",
+        "ingredients_raw": ingredients,
+        "steps_raw": [],
+    }
+
+
+def checks(path):
+    """依序產生 (名稱, 是否通過)。"""
+    store = SQLiteRecipeStore(path)             # 與 main.py 相同：快取與索引共用同一個檔案
+    recipes = [_recipe(n) for n in range(10)]
+    store.set_many((r["original_url"], r) for r in recipes)
+
+    index = IngredientIndex(path, is_alive=store.contains)
+    index.add_many(recipes)
+    yield "add 10 recipes", len(index) == 10
+
+    for r in recipes[1:]:
+        store.delete(r["original_url"])
+    yield "prune removes recipes no longer cached", index.prune() == 9 and len(index) == 1
+
+    reloaded = IngredientIndex(path, is_alive=store.contains)
+    yield "pruned recipes stay gone after reload", len(reloaded) == 1
+    yield "search after reload", reloaded.search(["雞"]) == [recipes[0]["original_url"]]
+
+    # 兩個 worker：各自加入的食譜在 sync 後互相可見，被移除的不會被另一個 worker 的資料帶回來
+    other = IngredientIndex(path)
+    other.add(_recipe(100, "牛肉"))
+    index.sync()
+    yield "sync reads recipes added by another worker", index.search(["牛肉"]) == [_recipe(100)["original_url"]]
+
+    index.discard([_recipe(100)["original_url"]])
+    other.add(_recipe(101, "豬肉"))
+    index.sync()
+    yield "discarded recipe is not resurrected by sync", index.search(["牛肉"]) == []
+    yield "fresh load matches", len(IngredientIndex(path)) == 2
+
+    memory_only = IngredientIndex()
+    memory_only.add_many(recipes)
+    yield "memory-only index", len(memory_only) == 10 and memory_only.sync() == 0
+
+
+def main():
+    failures = 0
+    with tempfile.TemporaryDirectory(prefix="recipe-index-") as workdir:
+        for name, passed in checks(os.path.join(workdir, "recipes.db")):
+            print(f"{'ok  ' if passed else 'FAIL'}  {name}")
+            failures += not passed
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+# bench/check_parity.py
+# 檢查 extract.py 的 lxml 與 BeautifulSoup 兩個引擎輸出是否完全相同：
+# 以 fixtures/ 中錄下的頁面，加上幾個容易出現差異的片段 (script / style、沒有宣告編碼、未知編碼) 比對。
+# 修改 XPath 或換了新的 fixtures 後執行：
+#     python bench/check_parity.py
+# 有任何差異時列出並以狀態碼 1 結束。
+
+import os
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import extract                          # noqa: E402
+import fake_icook                       # noqa: E402
+
+_STEP_SNIPPET = (
+    '<figure class="recipe-step-instruction">'
+    '<figcaption class="recipe-step-description">'
+    '<p class="recipe-step-description-content">雞肉切塊<script>track("step");</script>'
+    ' 以 <b>醬油</b> 醃 <style>p { color: red }</style>十分鐘</p></figcaption>'
+    '<a class="recipe-step-cover"><img data-src="https://example.com/step.jpg"></a></figure>'
+)
+_CARD_SNIPPET = (
+    '<ul><li class="browse-recipe-item"><a href="/recipes/1">'
+    '<h2 class="browse-recipe-name"> 三杯雞 <script>var x = 1;</script></h2>'
+    '<p class="browse-recipe-content-ingredient">食材：雞肉、九層塔</p>'
+    '<img class="browse-recipe-cover-img" src="https://example.com/cover.jpg"></a></li></ul>'
+)
+
+
+def cases():
+    """產生 (名稱, 擷取類型, 原始位元組, 宣告的編碼)。"""
+    fake = fake_icook.FakeICook()
+    yield "fixtures/search.html", "cards", fake.search_page("雞肉", 1), "utf-8"
+    yield "fixtures/search.html (no declared charset)", "cards", fake.search_page("雞肉", 1), None
+    yield "fixtures/recipe.html", "steps", fake.recipe_bytes, "utf-8"
+    yield "step with script/style", "steps", _STEP_SNIPPET.encode("utf-8"), "utf-8"
+    yield "step without any charset", "steps", _STEP_SNIPPET.encode("utf-8"), None
+    yield "step with unknown charset", "steps", _STEP_SNIPPET.encode("utf-8"), "bogus-enc"
+    yield "card with script", "cards", _CARD_SNIPPET.encode("utf-8"), "utf-8"
+    yield "card in big5", "cards", _CARD_SNIPPET.encode("big5"), "big5"
+
+
+def main():
+    if extract.etree is None:
+        print("lxml is not installed; only the BeautifulSoup engine is in use")
+        return 0
+
+    engines = {
+        "cards": (extract._extract_cards_lxml, extract._extract_cards_bs4),
+        "steps": (extract._extract_steps_lxml, extract._extract_steps_bs4),
+    }
+    failures = 0
+    for name, kind, content, encoding in cases():
+        lxml_extract, bs4_extract = engines[kind]
+        got, expected = lxml_extract(content, encoding), bs4_extract(content, encoding)
+        if got == expected and expected:
+            print(f"ok    {name} ({len(expected)} {kind})")
+            continue
+        failures += 1
+        print(f"FAIL  {name}")
+        print(f"      lxml: {got}")
+        print(f"      bs4:  {expected}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
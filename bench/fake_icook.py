@@ -0,0 +1,162 @@
+# bench/fake_icook.py
+# 本地的假 iCook 伺服器：重播 fixtures/ 中錄下的搜尋結果頁與食譜頁，
+# 可設定回應延遲、抖動與錯誤注入，讓效能量測不必連到真正的 iCook。
+#
+# 單獨啟動：
+#     python bench/fake_icook.py --port 8001 --latency-ms 150 --error-rate 0.02
+#     ICOOK_BASE_URL=http://127.0.0.1:8001 uvicorn main:app --port 8000
+#
+# 要換成真實頁面，只需把瀏覽器另存的 HTML 覆蓋 fixtures/search.html 與 fixtures/recipe.html。
+
+import argparse
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+_CARD_HREF = re.compile(r'href="/recipes/(\d+)"')
+_CARD_INGREDIENTS = re.compile(r'(<p class="browse-recipe-content-ingredient">(?:[^<：]*：)?)')
+
+
+class FakeICook:
+    """
+    假 iCook 的設定與頁面產生邏輯。
+    latency_ms / jitter_ms: 每個回應的固定延遲與隨機抖動 (毫秒)
+    error_rate / error_status: 以此機率回傳錯誤狀態碼
+    pages: 搜尋結果共有幾頁，超過後回傳沒有卡片的頁面
+    match_ratio: 每頁有多少比例的卡片會在食材摘要中加入查詢的食材 (其餘卡片會被過濾掉)
+    """
+
+    def __init__(self, fixtures_dir=FIXTURES_DIR, latency_ms=0, jitter_ms=0,
+                 error_rate=0.0, error_status=503, pages=3, match_ratio=1.0, seed=None):
+        with open(os.path.join(fixtures_dir, "search.html"), encoding="utf-8") as f:
+            self.search_html = f.read()
+        with open(os.path.join(fixtures_dir, "recipe.html"), encoding="utf-8") as f:
+            self.recipe_bytes = f.read().encode("utf-8")
+        self.empty_bytes = b"<!DOCTYPE html><html><body><ul class=\"browse-recipe-list\"></ul></body></html>"
+
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.pages = pages
+        self.match_ratio = match_ratio
+
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def delay(self):
+        with self._random_lock:
+            jitter = self._random.uniform(0, self.jitter_ms)
+        time.sleep((self.latency_ms + jitter) / 1000)
+
+    def should_fail(self):
+        with self._random_lock:
+            self.requests += 1
+            failed = self._random.random() < self.error_rate
+            self.errors += failed
+            return failed
+
+    def search_page(self, keyword, page):
+        """
+        產生某個查詢的第 page 頁：卡片網址依頁碼改寫避免重複，部分卡片的食材摘要加入查詢的食材。
+        """
+        if page > self.pages:
+            return self.empty_bytes
+
+        html = _CARD_HREF.sub(lambda m: f'href="/recipes/{page}{m.group(1)}"', self.search_html)
+
+        ingredients = "、".join(k for k in keyword.split("+") if k)
+        total = len(_CARD_INGREDIENTS.findall(html))
+        matching = round(total * self.match_ratio)
+        counter = iter(range(total))
+
+        def inject(m):
+            if ingredients and next(counter) < matching:
+                return m.group(1) + ingredients + "、"
+            return m.group(1)
+
+        return _CARD_INGREDIENTS.sub(inject, html).encode("utf-8")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"           # 支援 keep-alive，與正式環境的連線池行為一致
+    fake = None                             # 由 make_server 設定
+
+    def do_GET(self):
+        fake = self.fake
+        fake.delay()
+
+        if fake.should_fail():
+            return self._send(fake.error_status, b"injected error", "text/plain")
+
+        parts = urlsplit(self.path)
+        path = unquote(parts.path)
+        if path.startswith("/search/"):
+            page = int(parse_qs(parts.query).get("page", ["1"])[0])
+            return self._send(200, fake.search_page(path[len("/search/"):].strip("/"), page))
+        if path.startswith("/recipes/"):
+            return self._send(200, fake.recipe_bytes)
+        return self._send(404, b"not found", "text/plain")
+
+    def _send(self, status, body, content_type="text/html; charset=utf-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass                                # 壓測時不輸出每筆存取紀錄
+
+
+def make_server(host="127.0.0.1", port=8001, **options):
+    """建立 (尚未啟動的) 假 iCook 伺服器；options 傳給 FakeICook。"""
+    handler = type("FakeICookHandler", (_Handler,), {"fake": FakeICook(**options)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def add_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=100, help="每個回應的固定延遲 (毫秒)")
+    parser.add_argument("--jitter-ms", type=float, default=50, help="額外的隨機延遲上限 (毫秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="回傳錯誤的機率 (0~1)")
+    parser.add_argument("--error-status", type=int, default=503, help="錯誤時的 HTTP 狀態碼")
+    parser.add_argument("--pages", type=int, default=3, help="搜尋結果的頁數")
+    parser.add_argument("--match-ratio", type=float, default=1.0, help="每頁符合查詢食材的卡片比例 (0~1)")
+    parser.add_argument("--seed", type=int, default=None, help="亂數種子 (重現延遲與錯誤)")
+
+
+def server_options(args):
+    return {
+        "latency_ms": args.latency_ms,
+        "jitter_ms": args.jitter_ms,
+        "error_rate": args.error_rate,
+        "error_status": args.error_status,
+        "pages": args.pages,
+        "match_ratio": args.match_ratio,
+        "seed": args.seed,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地的假 iCook 伺服器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, **server_options(args))
+    print(f"fake iCook listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
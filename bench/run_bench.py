@@ -0,0 +1,195 @@
+# bench/run_bench.py
+# 離線效能量測：以固定併發數對 GET /recipes 與 POST /recipe_details 送出請求，
+# 回報吞吐量與 p50 / p95 / p99 延遲，最後附上 API 的 /metrics 各階段耗時。
+#
+# 一鍵離線量測 (自動啟動假 iCook 與 API)：
+#     python bench/run_bench.py --spawn --mode mixed --concurrency 8 --requests 300
+# 每次都用不同的食材組合 (繞過搜尋快取與食材索引，量測完整的爬取流程)：
+#     python bench/run_bench.py --spawn --unique-queries
+# 對已經在跑的 API 量測：
+#     python bench/run_bench.py --api http://127.0.0.1:8000
+
+import argparse
+import itertools
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+import fake_icook                       # noqa: E402
+from metrics import percentile          # noqa: E402
+
+DEFAULT_QUERIES = ["雞肉 洋蔥", "雞肉", "雞肉,九層塔", "洋蔥 雞肉", "雞肉 蔥"]
+
+_local = threading.local()
+
+
+def _session():
+    # 每個壓測執行緒各自一條 keep-alive 連線
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+    return session
+
+
+def _wait_until_up(url, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def spawn(args):
+    """啟動假 iCook (本行程的背景執行緒) 與 API (uvicorn 子行程)，回傳 (API 網址, 清理函數)。"""
+    fake = fake_icook.make_server("127.0.0.1", args.fake_port, **fake_icook.server_options(args))
+    threading.Thread(target=fake.serve_forever, daemon=True).start()
+
+    env = dict(os.environ, ICOOK_BASE_URL=f"http://127.0.0.1:{args.fake_port}")
+    env.pop("RECIPE_CACHE_PATH", None)      # 使用 In-Memory 快取 (食材索引也只在記憶體中)
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+         "--port", str(args.api_port), "--log-level", "warning"],
+        cwd=REPO_DIR, env=env,
+    )
+    base_url = f"http://127.0.0.1:{args.api_port}"
+    try:
+        _wait_until_up(base_url + "/metrics")
+    except RuntimeError:
+        api.kill()
+        fake.shutdown()
+        raise
+
+    def cleanup():
+        api.terminate()
+        api.wait(timeout=10)
+        fake.shutdown()
+
+    return base_url, cleanup
+
+
+def make_jobs(args, base_url):
+    """依 --mode 產生無限的請求序列，每個元素為 (標籤, 送出請求的函數)。"""
+    queries = args.queries.split("|") if args.queries else DEFAULT_QUERIES
+    params = {"compact": "true"} if args.compact else {}
+    counter = itertools.count()
+
+    def search():
+        q = queries[next(counter) % len(queries)]
+        if args.unique_queries:
+            q = f"{q} 食材{next(counter)}"  # fake iCook 會把查詢的食材寫進摘要，因此仍會有符合的卡片
+        return _session().get(f"{base_url}/recipes", params={"q": q, **params}, timeout=60)
+
+    if args.mode == "recipes":
+        return itertools.repeat(("GET /recipes", search))
+
+    # 先搜尋一輪，收集可查詢詳情的食譜網址
+    urls = []
+    for q in queries:
+        resp = requests.get(f"{base_url}/recipes", params={"q": q, "compact": "true"}, timeout=60)
+        if resp.ok:
+            urls.extend(r["original_url"] for r in resp.json()["recipes"])
+    if not urls:
+        raise RuntimeError("warm-up searches returned no recipes; cannot benchmark /recipe_details")
+    url_cycle = itertools.cycle(urls)
+
+    def details():
+        return _session().post(
+            f"{base_url}/recipe_details", params=params,
+            json={"recipe_url": next(url_cycle)}, timeout=60,
+        )
+
+    if args.mode == "details":
+        return itertools.repeat(("POST /recipe_details", details))
+    # mixed：模擬 LINE BOT 的使用情境，每次搜尋後約有 3 次按鈕點擊
+    return itertools.cycle([("GET /recipes", search)] + [("POST /recipe_details", details)] * 3)
+
+
+def run(args, base_url):
+    jobs = make_jobs(args, base_url)
+    jobs_lock = threading.Lock()
+    latencies = {}
+    statuses = Counter()
+    results_lock = threading.Lock()
+
+    def worker(_):
+        with jobs_lock:
+            label, send = next(jobs)
+        started = time.perf_counter()
+        try:
+            status = send().status_code
+        except requests.RequestException as exc:
+            status = type(exc).__name__
+        elapsed = time.perf_counter() - started
+        with results_lock:
+            latencies.setdefault(label, []).append(elapsed)
+            statuses[(label, status)] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(worker, range(args.requests)))
+    wall = time.perf_counter() - started
+
+    print(f"\n{args.requests} requests, concurrency {args.concurrency}, {wall:.2f}s wall, "
+          f"{args.requests / wall:.1f} req/s")
+    print(f"{'endpoint':<24}{'count':>7}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for label, values in sorted(latencies.items()):
+        values.sort()
+        print(f"{label:<24}{len(values):>7}{len(values) / wall:>9.1f}"
+              f"{percentile(values, 50) * 1000:>10.1f}{percentile(values, 95) * 1000:>10.1f}"
+              f"{percentile(values, 99) * 1000:>10.1f}{values[-1] * 1000:>10.1f}")
+    print("status codes:", ", ".join(f"{label} {status}: {n}" for (label, status), n in sorted(statuses.items(), key=str)))
+
+    # API 內部各階段耗時
+    try:
+        stages = requests.get(f"{base_url}/metrics", timeout=10).json()
+    except (requests.RequestException, ValueError):
+        return
+    print(f"\n{'stage':<36}{'count':>7}{'avg ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, s in stages.items():
+        print(f"{name:<36}{s['count']:>7}{s['avg_ms']:>10.1f}{s['p50_ms']:>10.1f}"
+              f"{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recipe-AI 離線效能量測")
+    parser.add_argument("--api", default="http://127.0.0.1:8000", help="要量測的 API 網址 (未使用 --spawn 時)")
+    parser.add_argument("--spawn", action="store_true", help="自動啟動假 iCook 與 API")
+    parser.add_argument("--fake-port", type=int, default=8001)
+    parser.add_argument("--api-port", type=int, default=8002)
+    parser.add_argument("--mode", choices=["recipes", "details", "mixed"], default="mixed")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--queries", default="", help="以 | 分隔的查詢清單")
+    parser.add_argument("--unique-queries", action="store_true", help="每次搜尋使用不同的查詢 (繞過快取)")
+    parser.add_argument("--compact", action="store_true", help="要求精簡格式的回應")
+    fake_icook.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.spawn:
+        base_url, cleanup = spawn(args)
+    else:
+        base_url, cleanup = args.api.rstrip("/"), None
+    try:
+        run(args, base_url)
+    finally:
+        if cleanup:
+            cleanup()
+
+
+if __name__ == "__main__":
+    main()
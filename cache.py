@@ -0,0 +1,280 @@
+# cache.py
+# 食譜快取模組：取代原本只會無限成長的 RECIPE_CACHE 字典。
+# 提供最大筆數與記憶體上限、LRU 淘汰、TTL 過期 (讀取時檢查 + 定期清掃)，
+# 以及命中 / 未命中 / 淘汰次數的統計。
+# SearchCache 則以「正規化後的食材集合 + limit」為 Key，只記錄結果的網址清單，
+# 實際的食譜內容仍從 RecipeCache 取出，不重複佔用記憶體。
+# 每筆食譜只保存一份預先編碼好的精簡 UTF-8 JSON 位元組 (與 store.SQLiteRecipeStore 相同)，
+# 精簡格式的回應可直接回傳，需要字典時再 json.loads 還原。
+
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def encode_recipe(recipe):
+    """將一筆清理後的食譜編碼成精簡 (不縮排) 的 UTF-8 JSON 位元組。"""
+    return json.dumps(recipe, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class _Entry:
+    """單筆快取食譜（取代 {"data": ..., "timestamp": ...} 的巢狀字典），只保存編碼後的位元組。"""
+    __slots__ = ("body", "expires_at", "size")
+
+    def __init__(self, recipe, expires_at):
+        self.body = encode_recipe(recipe)
+        self.expires_at = expires_at
+        self.size = sys.getsizeof(self) + sys.getsizeof(self.body)  # 估算佔用的位元組數
+
+    def to_dict(self):
+        """還原成 parser.clean_recipe 的輸出格式。"""
+        return json.loads(self.body)
+
+
+class RecipeCache:
+    """
+    以食譜網址為 Key 的執行緒安全快取。
+    max_entries: 最多保留幾筆
+    max_bytes:   估算的記憶體上限 (位元組)
+    ttl:         每筆資料的有效秒數
+    sweep_interval: 定期清除過期資料的間隔秒數 (在寫入時順便執行)
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=32 * 1024 * 1024, ttl=3600, sweep_interval=60):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+
+        self._entries = OrderedDict()       # 依使用順序排列：最舊的在前面
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._next_sweep = time.monotonic() + sweep_interval
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, url):
+        return self.contains(url)
+
+    def contains(self, url):
+        """
+        只檢查食譜是否存在且未過期：不還原內容、不計入命中統計，也不改變 LRU 順序。
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            return entry is not None and entry.expires_at > time.monotonic()
+
+    def get(self, url):
+        """
+        取得快取的食譜 (clean_recipe 格式)；不存在或已過期時返回 None。
+        """
+        entry = self._lookup(url)
+        return entry.to_dict() if entry is not None else None
+
+    def get_body(self, url):
+        """
+        取得快取食譜預先編碼好的精簡 JSON 位元組；不存在或已過期時返回 None。
+        """
+        entry = self._lookup(url)
+        return entry.body if entry is not None else None
+
+    def _lookup(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove(url)           # 讀取時發現過期 → 直接移除
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(url)  # 標記為最近使用
+            self.hits += 1
+            return entry
+
+    def set(self, url, recipe):
+        """
+        存入一筆清理後的食譜，必要時淘汰最久未使用的項目。
+        """
+        if not url:
+            return
+        entry = _Entry(recipe, time.monotonic() + self.ttl)
+        with self._lock:
+            if url in self._entries:
+                self._remove(url)
+            self._entries[url] = entry
+            self._bytes += entry.size
+            self._maybe_sweep()
+            self._enforce_limits()
+
+    def set_many(self, items):
+        """批次存入多筆 (url, recipe)，與 store.SQLiteRecipeStore 的介面一致。"""
+        for url, recipe in items:
+            self.set(url, recipe)
+
+    def delete(self, url):
+        with self._lock:
+            if url in self._entries:
+                self._remove(url)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """回傳快取的使用統計。"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    # ---------------------- 內部函數 (呼叫前需持有 self._lock) ----------------------
+
+    def _remove(self, url):
+        entry = self._entries.pop(url)
+        self._bytes -= entry.size
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.sweep_interval
+        expired = [url for url, entry in self._entries.items() if entry.expires_at <= now]
+        for url in expired:
+            self._remove(url)
+        self.expirations += len(expired)
+
+    def _enforce_limits(self):
+        # 至少保留剛寫入的那一筆，避免單筆超過 max_bytes 時清空整個快取後仍無法存入
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            url = next(iter(self._entries))
+            self._remove(url)
+            self.evictions += 1
+
+
+def query_key(ingredients, limit):
+    """
+    將食材清單正規化 (去重、排序) 後與 limit 組成查詢 Key。
+    "雞肉 洋蔥"、"洋蔥,雞肉"、"雞肉  洋蔥" 都會得到相同的 Key。
+    """
+    return (tuple(sorted(set(ingredients))), limit)
+
+
+class SearchCache:
+    """
+    搜尋結果快取：Key 為 query_key() 的結果，Value 為食譜網址的 tuple。
+    取出時透過 recipe_cache 還原完整食譜；只要其中任何一筆已被淘汰或過期，就視為未命中。
+    """
+
+    def __init__(self, recipe_cache, max_entries=500, ttl=600):
+        self.recipe_cache = recipe_cache
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._entries = OrderedDict()       # key → (expires_at, urls)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        取得快取的搜尋結果 (clean_recipe 格式的清單)；找不到時返回 None。
+        注意：確定沒有符合食譜的空結果也會被快取，並以空清單 [] 返回
+        (iCook 抓取失敗或不完整的結果則不會存入，見 main._scrape_and_cache)。
+        """
+        items = self._resolve(key, self.recipe_cache.get)
+        return [recipe for _, recipe in items] if items is not None else None
+
+    def get_bodies(self, key):
+        """
+        與 get() 相同，但回傳每筆食譜預先編碼好的 JSON 位元組清單。
+        """
+        items = self.get_body_items(key)
+        return [body for _, body in items] if items is not None else None
+
+    def get_body_items(self, key):
+        """
+        與 get_bodies() 相同，但回傳 (網址, JSON 位元組) 的清單。
+        """
+        return self._resolve(key, self.recipe_cache.get_body)
+
+    def _resolve(self, key, fetch):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, urls = item
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+
+        items = []
+        for url in urls:
+            recipe = fetch(url)
+            if recipe is None:
+                # 某筆食譜已不在快取中，整筆搜尋結果失效，交給呼叫端重新爬取
+                with self._lock:
+                    self._entries.pop(key, None)
+                    self.misses += 1
+                return None
+            items.append((url, recipe))
+
+        with self._lock:
+            self.hits += 1
+        return items
+
+    def set(self, key, urls):
+        """
+        記錄一次搜尋的結果網址 (食譜本身需先存入 recipe_cache)。
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.ttl, tuple(urls))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """回傳搜尋快取的使用統計。"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
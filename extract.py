@@ -0,0 +1,223 @@
+# extract.py
+# HTML 擷取模組：從 iCook 的搜尋結果頁與食譜頁中取出卡片與步驟資料。
+# 預設使用 lxml (C 實作) 直接解析回應的原始位元組，並以預先編譯的 XPath 只走訪需要的子樹
+# (.browse-recipe-item 卡片與 figure.recipe-step-instruction 步驟)；
+# 沒有安裝 lxml 時退回原本的 BeautifulSoup + CSS 選擇器寫法，兩者輸出的欄位完全相同。
+
+import os
+import re
+import threading
+
+from bs4 import BeautifulSoup          # 後備引擎：純 Python 的 html.parser
+
+try:
+    from lxml import etree
+except ImportError:                    # lxml 列在 requirements.txt，但仍保留後備方案
+    etree = None
+
+# 可用環境變數改指向本地的假 iCook 伺服器 (bench/fake_icook.py)，以便離線量測效能
+ICOOK_BASE_URL = os.getenv("ICOOK_BASE_URL", "https://icook.tw").rstrip("/")
+
+
+def get_best_image_url(img_tag):
+    """
+    從 img 標籤中提取最佳圖片 URL，以應對懶載入和響應式圖片。
+    優先順序：srcset (抓取最大解析度) > data-src > src
+    img_tag 可以是 BeautifulSoup 的 Tag 或 lxml 的元素 (兩者都支援 .get(屬性))。
+    """
+    if img_tag is None:
+        return ""                      # 如果沒有圖片標籤，則返回空字串
+
+    # 1. 優先從 srcset 提取最大尺寸的 URL(用於響應式圖片)
+    srcset = img_tag.get("srcset")
+    if srcset:
+        try:
+            # 抓取 srcset 清單中的第一個 URL (通常解析度最高)
+            first_url_descriptor = srcset.split(",")[0].strip()
+            # 提取 URL 部分 (在空格之前)
+            return first_url_descriptor.split(" ")[0]
+        except IndexError:
+            # 如果解析 srcset 失敗，則嘗試其他屬性
+            pass
+
+    # 2. 次要嘗試 data-src (iCook 網站常用於懶載入)
+    data_src = img_tag.get("data-src")
+    if data_src:
+        return data_src
+
+    # 3. 最後嘗試 src (可能是 Base64 透明圖，但作為後備)
+    return img_tag.get("src", "")
+
+
+# ---------------------------------------------------------------------
+# lxml 引擎：預先編譯的 XPath (等同於原本的 CSS 選擇器)
+# ---------------------------------------------------------------------
+
+def _has_class(name):
+    # 等同 CSS 的 .name：class 屬性以空白分隔，需完整比對其中一個類別
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+if etree is not None:
+    _XP_CARDS = etree.XPath(f"//*[{_has_class('browse-recipe-item')}]")
+    _XP_CARD_TITLE = etree.XPath(f".//*[{_has_class('browse-recipe-name')}]")
+    _XP_CARD_LINK = etree.XPath(".//a")
+    _XP_CARD_SUMMARY = etree.XPath(f".//*[{_has_class('browse-recipe-content-ingredient')}]")
+    _XP_CARD_IMG = etree.XPath(f".//img[{_has_class('browse-recipe-cover-img')}]")
+
+    _XP_STEPS = etree.XPath(f"//figure[{_has_class('recipe-step-instruction')}]")
+    _XP_STEP_TEXT = etree.XPath(
+        f".//figcaption[{_has_class('recipe-step-description')}]"
+        f"/p[{_has_class('recipe-step-description-content')}]"
+    )
+    _XP_STEP_IMG = etree.XPath(f".//a[{_has_class('recipe-step-cover')}]/img")
+
+    # 只收集文字節點 (註解已在解析時移除)，並略過 <script> / <style> 的內容，與 BeautifulSoup 的 get_text() 行為一致
+    _XP_TEXT_NODES = etree.XPath(".//text()[not(ancestor::script) and not(ancestor::style)]")
+
+    _LOCAL = threading.local()          # lxml 的 parser 不可跨執行緒共用 → 每個執行緒各自快取
+
+
+_META_CHARSET = re.compile(rb"<meta[^>]+charset", re.IGNORECASE)
+_META_SNIFF_BYTES = 4096
+
+
+def _parse(content, encoding):
+    """
+    直接從回應位元組建立 lxml 樹；encoding 為 HTTP 回應標頭宣告的編碼 (可為 None)。
+    沒有宣告時交給 lxml 依 <meta charset> 判斷；連 <meta> 都沒有則以 UTF-8 解碼
+    (與 BeautifulSoup 相同，lxml 預設會當成 ISO-8859-1)。
+    """
+    if not encoding and not _META_CHARSET.search(content, 0, _META_SNIFF_BYTES):
+        encoding = "utf-8"
+    try:
+        parser = _parser(encoding)
+    except LookupError:
+        # 標頭宣告了 lxml 不認得的編碼：當作沒有宣告，避免整個請求失敗
+        return _parse(content, None)
+    return etree.fromstring(content, parser)
+
+
+def _parser(encoding):
+    parsers = getattr(_LOCAL, "parsers", None)
+    if parsers is None:
+        parsers = _LOCAL.parsers = {}
+    key = (encoding or "").lower()
+    parser = parsers.get(key)
+    if parser is None:
+        parser = etree.HTMLParser(encoding=encoding or None, remove_comments=True)
+        parsers[key] = parser
+    return parser
+
+
+def _first(xpath, node):
+    found = xpath(node)
+    return found[0] if found else None
+
+
+def _text(node):
+    """等同 BeautifulSoup 的 tag.text。"""
+    return "".join(_XP_TEXT_NODES(node))
+
+
+def _text_stripped(node):
+    """等同 BeautifulSoup 的 tag.get_text(strip=True)：每段文字各自去除空白後直接相接。"""
+    return "".join(t.strip() for t in _XP_TEXT_NODES(node))
+
+
+def _extract_cards_lxml(content, encoding):
+    root = _parse(content, encoding)
+    if root is None:
+        return []
+
+    cards = []
+    for card in _XP_CARDS(root):
+        title_tag = _first(_XP_CARD_TITLE, card)
+        link_tag = _first(_XP_CARD_LINK, card)
+        href = link_tag.get("href") if link_tag is not None else None
+        summary_tag = _first(_XP_CARD_SUMMARY, card)
+
+        cards.append({
+            "title": _text(title_tag).strip() if title_tag is not None else "",
+            "url": ICOOK_BASE_URL + href if href is not None else "",
+            "image": get_best_image_url(_first(_XP_CARD_IMG, card)),
+            "ingredients": _text(summary_tag).strip() if summary_tag is not None else "",
+        })
+    return cards
+
+
+def _extract_steps_lxml(content, encoding):
+    root = _parse(content, encoding)
+    if root is None:
+        return []
+
+    steps_list = []
+    for step in _XP_STEPS(root):
+        p_tag = _first(_XP_STEP_TEXT, step)
+        steps_list.append({
+            "description": _text_stripped(p_tag) if p_tag is not None else "",
+            "image": get_best_image_url(_first(_XP_STEP_IMG, step)),
+        })
+    return steps_list
+
+
+# ---------------------------------------------------------------------
+# BeautifulSoup 引擎 (原本的寫法，作為後備)
+# ---------------------------------------------------------------------
+
+def _extract_cards_bs4(content, encoding):
+    soup = BeautifulSoup(content, "html.parser", from_encoding=encoding)
+
+    cards = []
+    for card in soup.select(".browse-recipe-item"):  # 選擇所有食譜卡片容器（搜尋結果列表）
+        title_tag = card.select_one(".browse-recipe-name")
+        link_tag = card.select_one("a")
+        summary_tag = card.select_one(".browse-recipe-content-ingredient")
+
+        cards.append({
+            "title": title_tag.text.strip() if title_tag else "",
+            "url": (
+                ICOOK_BASE_URL + link_tag["href"]
+                if link_tag and link_tag.has_attr("href")
+                else ""
+            ),
+            "image": get_best_image_url(card.select_one("img.browse-recipe-cover-img")),
+            "ingredients": summary_tag.text.strip() if summary_tag else "",
+        })
+    return cards
+
+
+def _extract_steps_bs4(content, encoding):
+    soup = BeautifulSoup(content, "html.parser", from_encoding=encoding)
+
+    steps_list = []
+    for step in soup.select("figure.recipe-step-instruction"):
+        p_tag = step.select_one("figcaption.recipe-step-description > p.recipe-step-description-content")
+        steps_list.append({
+            "description": p_tag.get_text(strip=True) if p_tag else "",
+            "image": get_best_image_url(step.select_one("a.recipe-step-cover > img")),
+        })
+    return steps_list
+
+
+# ---------------------------------------------------------------------
+# 對外介面
+# ---------------------------------------------------------------------
+
+def extract_cards(content, encoding=None):
+    """
+    從搜尋結果頁的原始位元組中取出所有食譜卡片：
+    [{"title": ..., "url": ..., "image": ..., "ingredients": ...}, ...]
+    """
+    if etree is not None:
+        return _extract_cards_lxml(content, encoding)
+    return _extract_cards_bs4(content, encoding)
+
+
+def extract_steps(content, encoding=None):
+    """
+    從食譜頁的原始位元組中取出所有步驟：[{"description": ..., "image": ...}, ...]
+    """
+    if etree is not None:
+        return _extract_steps_lxml(content, encoding)
+    return _extract_steps_bs4(content, encoding)
@@ -0,0 +1,252 @@
+# ingredient_index.py
+# 本地食材倒排索引：由 clean_recipe 產生過的食譜建立「食材詞 → 食譜編號清單」的對照，
+# 讓 GET /recipes 在索引內已有足夠符合的食譜時直接回答，不必即時爬取 iCook。
+# 每道食譜只記錄網址，內容仍從 RECIPE_CACHE 取出。使用 SQLite 持久化快取時，索引也存在同一個檔案
+# (每道食譜一列，加入與移除時直接寫入)，啟動時一次讀回，並定期讀入其他 worker 新加入的食譜。
+# 食譜內容已被淘汰或過期的網址會定期從索引移除 (prune)，索引不會無限成長。
+
+import re
+import threading
+import time
+from array import array
+
+from store import connect
+
+# ingredients_raw 的分隔符號：空白、頓號、逗號、冒號、斜線、括號等
+_TOKEN_SPLIT = re.compile(r"[\s、，,。；;：:／/（）()\[\]【】]+")
+
+# seq 只增不減 (AUTOINCREMENT 不會重用已刪除的編號)，各 worker 依此只讀入上次之後新增的列
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingredient_index (
+    seq    INTEGER PRIMARY KEY AUTOINCREMENT,
+    url    TEXT NOT NULL UNIQUE,
+    tokens TEXT NOT NULL
+);
+"""
+
+
+def tokenize_ingredients(text):
+    """
+    將食材摘要切成不重複的食材詞，例如 "食材：雞肉、洋蔥" → {"食材", "雞肉", "洋蔥"}。
+    """
+    return {token.lower() for token in _TOKEN_SPLIT.split(text or "") if token}
+
+
+class IngredientIndex:
+    """
+    執行緒安全的食材倒排索引。
+    path:          SQLite 檔案路徑 (與 store.SQLiteRecipeStore 共用；None 表示只存在記憶體中)
+    sync_interval: 每隔幾秒讀入其他 worker 新加入的食譜 (在加入新食譜時順便執行)
+    is_alive:      is_alive(url) 為 False 的食譜會在定期清理時移除 (例如 RECIPE_CACHE.contains)
+    prune_interval: 定期清理的間隔秒數 (在加入新食譜時順便執行)
+    """
+
+    def __init__(self, path=None, sync_interval=30, is_alive=None, prune_interval=300):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.is_alive = is_alive
+        self.prune_interval = prune_interval
+
+        self._urls = []                     # 食譜編號 → 網址 (已移除的為 None，壓縮時才重新編號)
+        self._ids = {}                      # 網址 → 食譜編號 (只含尚未移除的)
+        self._removed = 0                   # _urls 中 None 的數量
+        self._postings = {}                 # 食材詞 → array('I') 食譜編號 (遞增排列)
+        self._chars = {}                    # 字元 → 含有該字元的食材詞集合 (子字串比對時縮小候選範圍)
+        self._lock = threading.Lock()
+        self._local = threading.local()     # sqlite3 連線不可跨執行緒共用 → 每個執行緒各自一條
+        self._synced_seq = 0                # 已讀入的最大 seq
+        self._next_sync = time.monotonic() + sync_interval
+        self._next_prune = time.monotonic() + prune_interval
+
+        if path:
+            self._conn().executescript(_SCHEMA)
+            self.sync()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, recipe):
+        """加入一筆 clean_recipe 格式的食譜 (已收錄的網址會略過)。"""
+        self.add_many([recipe])
+
+    def add_many(self, recipes):
+        """
+        批次加入多筆食譜；有設定 path 時在同一個交易中寫入資料庫。
+        """
+        rows = []
+        with self._lock:
+            for recipe in recipes:
+                url = recipe.get("original_url")
+                tokens = tokenize_ingredients(recipe.get("ingredients_raw", ""))
+                if url and self._add(url, tokens):
+                    rows.append((url, " ".join(sorted(tokens))))   # 食材詞不含空白，以空白分隔儲存
+        if rows and self.path:
+            conn = self._conn()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany("INSERT OR IGNORE INTO ingredient_index (url, tokens) VALUES (?, ?)", rows)
+        self._maybe_sync()
+        self._maybe_prune()
+
+    def discard(self, urls):
+        """
+        從索引移除指定的網址 (資料庫中的列一併刪除，其他 worker 也不會再讀入)；
+        記憶體中先標記為已移除，累積到一定比例後才壓縮 posting list 並重新編號。
+        """
+        removed = []
+        with self._lock:
+            for url in urls:
+                doc_id = self._ids.pop(url, None)
+                if doc_id is None:
+                    continue
+                self._urls[doc_id] = None
+                self._removed += 1
+                removed.append((url,))
+            if self._removed * 4 > len(self._urls):
+                self._compact()
+        if removed and self.path:
+            conn = self._conn()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany("DELETE FROM ingredient_index WHERE url = ?", removed)
+
+    def prune(self, is_alive=None):
+        """
+        移除 is_alive(url) 為 False 的食譜，回傳移除的筆數。
+        檢查時不持有索引的鎖，避免查詢快取 (可能是 SQLite) 時阻塞搜尋。
+        """
+        is_alive = is_alive or self.is_alive
+        if is_alive is None:
+            return 0
+        with self._lock:
+            urls = list(self._ids)
+        dead = [url for url in urls if not is_alive(url)]
+        self.discard(dead)
+        return len(dead)
+
+    def search(self, ingredients):
+        """
+        回傳食材摘要中包含全部 ingredients 的食譜網址 (依收錄先後排列)。
+        與 scraper 的過濾規則一致採「子字串」比對：查詢「雞」也會找到食材詞「雞肉」、「雞腿」。
+        """
+        if not ingredients:
+            return []
+        with self._lock:
+            matched = None
+            # 先處理較長 (通常較少見) 的食材，讓交集儘早縮小
+            for ingredient in sorted({i.lower() for i in ingredients}, key=len, reverse=True):
+                docs = set()
+                for token in self._matching_tokens(ingredient):
+                    posting = self._postings[token]
+                    docs.update(posting if matched is None else (d for d in posting if d in matched))
+                matched = docs
+                if not matched:
+                    return []
+            urls = (self._urls[doc_id] for doc_id in sorted(matched))
+            return [url for url in urls if url is not None]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "recipes": len(self._ids),
+                "tokens": len(self._postings),
+                "path": self.path,
+            }
+
+    # ---------------------- 內部函數 (呼叫前需持有 self._lock) ----------------------
+
+    def _add(self, url, tokens):
+        """加入一道食譜，已收錄時返回 False；新食譜的編號一定比舊的大，posting list 只需 append 就保持排序。"""
+        if url in self._ids:
+            return False
+        doc_id = len(self._urls)
+        self._urls.append(url)
+        self._ids[url] = doc_id
+        for token in tokens:
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = array("I")
+                self._index_chars(token)
+            posting.append(doc_id)
+        return True
+
+    def _index_chars(self, token):
+        for char in set(token):
+            tokens = self._chars.get(char)
+            if tokens is None:
+                tokens = self._chars[char] = set()
+            tokens.add(token)
+
+    def _compact(self):
+        """丟掉已移除的食譜並重新編號，同時刪除不再有任何食譜的食材詞。"""
+        new_ids = {}
+        urls = []
+        for doc_id, url in enumerate(self._urls):
+            if url is not None:
+                new_ids[doc_id] = len(urls)
+                urls.append(url)
+        postings = {}
+        for token, posting in self._postings.items():
+            kept = array("I", (new_ids[d] for d in posting if d in new_ids))  # 舊編號遞增 → 新編號仍遞增
+            if kept:
+                postings[token] = kept
+        self._urls = urls
+        self._ids = {url: doc_id for doc_id, url in enumerate(urls)}
+        self._postings = postings
+        self._chars = {}
+        for token in postings:
+            self._index_chars(token)
+        self._removed = 0
+
+    def _matching_tokens(self, ingredient):
+        """
+        找出包含 ingredient 的所有食材詞：先取 ingredient 每個字元對應的食材詞集合的交集，
+        只對這些候選做子字串比對，不必掃描整個詞彙表。
+        """
+        candidates = [self._chars.get(char) for char in set(ingredient)]
+        if not all(candidates):
+            return []
+        candidates.sort(key=len)
+        return [token for token in candidates[0].intersection(*candidates[1:]) if ingredient in token]
+
+    # ---------------------- 資料庫存取 ----------------------
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+        return conn
+
+    def sync(self):
+        """讀入資料庫中上次之後新增的食譜 (包含本行程與其他 worker 寫入的)，回傳讀到的列數。"""
+        if not self.path:
+            return 0
+        rows = self._conn().execute(
+            "SELECT seq, url, tokens FROM ingredient_index WHERE seq > ? ORDER BY seq",
+            (self._synced_seq,),
+        ).fetchall()
+        with self._lock:
+            for seq, url, tokens in rows:
+                self._add(url, tokens.split())
+                self._synced_seq = max(self._synced_seq, seq)
+        return len(rows)
+
+    def _maybe_sync(self):
+        if not self.path:
+            return
+        with self._lock:                    # 同時加入食譜的多個執行緒只會有一個負責讀取
+            now = time.monotonic()
+            if now < self._next_sync:
+                return
+            self._next_sync = now + self.sync_interval
+        self.sync()
+
+    def _maybe_prune(self):
+        if self.is_alive is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_prune:
+                return
+            self._next_prune = now + self.prune_interval
+        self.prune()
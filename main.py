@@ -3,25 +3,82 @@
 # 以及最重要的——短期記憶體 (快取) 的角色
 # 以下主要實現了兩大功能：first time search-食譜搜尋 和 sec time search-食譜詳情查詢 (快取機制)
 
-from fastapi import FastAPI, Response, HTTPException    # 引入 FastAPI 核心、回應處理和錯誤處理模組
-from fastapi.encoders import jsonable_encoder           # 引入將 Python 物件轉為 JSON 格式的工具
+from fastapi import FastAPI, Request, HTTPException     # 引入 FastAPI 核心、請求物件和錯誤處理模組
+from fastapi.responses import StreamingResponse         # 引入串流回應 (NDJSON)
 from pydantic import BaseModel                          # 引入 Pydantic 用於定義資料結構 (驗證 POST 輸入)
-import json
 import os
+import time
 import uvicorn
-import time 
 
-from scraper import search_recipes      # 引入爬蟲模組（負責抓取資料）
+from scraper import search_recipes, iter_recipes, tokenize_query, STEPS_FLIGHT, UpstreamError  # 引入爬蟲模組（負責抓取資料）
 from parser import clean_recipe         # 引入資料清洗模組（負責標準化結構）
+from cache import RecipeCache, SearchCache, query_key, encode_recipe  # 引入快取模組（LRU + TTL，有容量上限）
+from singleflight import SingleFlight   # 引入請求合併模組（相同查詢同時只爬一次）
+from store import SQLiteRecipeStore     # 引入持久化快取模組（SQLite，可跨 worker 共用）
+from responses import encode_json, encode_recipe_list, json_response  # 引入回應模組（ETag、壓縮）
+from ingredient_index import IngredientIndex  # 引入本地食材倒排索引（不爬 iCook 也能回答常見查詢）
+from metrics import METRICS, timed      # 引入各階段耗時統計
 
 app = FastAPI()
 
+
+@app.middleware("http")
+async def record_request_time(request: Request, call_next):
+    # 記錄每個路由的處理時間 (串流回應只計算到開始送出為止)
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    stage = f"request {request.method} {route.path if route else 'unmatched'}"
+    METRICS.record(stage, time.perf_counter() - started, error=response.status_code >= 500)
+    return response
+
+
 # ----------------------------------------------------
 # 【核心快取結構與設定】
 # 用於儲存完整的食譜資料，以供第二次請求時直接讀取。
 # ----------------------------------------------------
-RECIPE_CACHE = {}               # 定義 In-Memory 快取：Python 字典，API 的臨時記憶體
-CACHE_TTL_SECONDS = 3600        # 快取有效期設定為 1 小時 (可調整)
+CACHE_TTL_SECONDS = 3600                    # 快取有效期設定為 1 小時 (可調整)
+CACHE_MAX_ENTRIES = 2000                    # 最多保留的食譜筆數
+CACHE_MAX_BYTES = 64 * 1024 * 1024          # 快取估算記憶體上限 (64 MB)
+
+# 設定 RECIPE_CACHE_PATH 環境變數 (例如 /data/recipes.db) 即改用 SQLite 持久化快取：
+# 重新部署後快取仍在，多個 uvicorn worker 也能共用同一份資料。
+CACHE_DB_PATH = os.getenv("RECIPE_CACHE_PATH")
+CACHE_DB_MAX_ENTRIES = 20000                # 磁碟快取可保留較多筆數
+
+if CACHE_DB_PATH:
+    RECIPE_CACHE = SQLiteRecipeStore(       # 定義持久化快取：SQLite (WAL 模式) 檔案
+        CACHE_DB_PATH,
+        max_entries=CACHE_DB_MAX_ENTRIES,
+        ttl=CACHE_TTL_SECONDS,
+    )
+else:
+    RECIPE_CACHE = RecipeCache(             # 定義 In-Memory 快取：有上限的 LRU 快取，API 的臨時記憶體
+        max_entries=CACHE_MAX_ENTRIES,
+        max_bytes=CACHE_MAX_BYTES,
+        ttl=CACHE_TTL_SECONDS,
+    )
+
+SEARCH_CACHE_TTL_SECONDS = 600              # 搜尋結果快取有效期 10 分鐘 (比食譜本身短，讓熱門食材能定期更新)
+SEARCH_CACHE_MAX_ENTRIES = 500              # 最多記住幾組不同的食材查詢
+SEARCH_LIMIT = 3                            # 每次搜尋回傳的食譜筆數
+
+SEARCH_CACHE = SearchCache(                 # 搜尋結果快取：只記錄網址，食譜內容共用 RECIPE_CACHE
+    RECIPE_CACHE,
+    max_entries=SEARCH_CACHE_MAX_ENTRIES,
+    ttl=SEARCH_CACHE_TTL_SECONDS,
+)
+
+# 本地食材索引：收錄所有爬取過的食譜，並定期移除已不在快取中的食譜。
+# 使用 SQLite 持久化快取時存在同一個檔案 (重新啟動後仍與快取內容對應，多個 worker 共用)；
+# In-Memory 快取重新啟動後就清空了，舊的索引無法回答任何查詢，因此索引也只放在記憶體中。
+INGREDIENT_INDEX = IngredientIndex(CACHE_DB_PATH, is_alive=RECIPE_CACHE.contains)
+
+SEARCH_FLIGHT = SingleFlight()              # 相同食材組合的搜尋同時只會有一個在爬取，其餘請求等待共用結果
+
+# 回應格式：預設維持原本 indent=4 的可讀 JSON；設定 RESPONSE_COMPACT=1 則預設改為精簡格式。
+# 精簡格式可直接使用快取中預先編碼好的位元組，不需重新序列化。各請求也可用 ?compact=true/false 覆寫。
+RESPONSE_COMPACT = os.getenv("RESPONSE_COMPACT", "0") == "1"
 
 # Pydantic 模型用於第二次 POST 請求的輸入
 class URLPayload(BaseModel):    
@@ -31,74 +88,222 @@ class URLPayload(BaseModel):
 # 路由 1: GET /recipes (第一次搜尋並快取 - 回傳完整資料)
 # ----------------------------------------------------
 @app.get("/recipes")            # 處理 GET 請求，用於初次食材搜尋
-def get_recipes(q: str):        # q 參數即為使用者輸入的食材
+def get_recipes(q: str, request: Request, compact: bool = RESPONSE_COMPACT):  # q 參數即為使用者輸入的食材
+    # 0. 先查搜尋結果快取：相同的食材組合 (不論順序、分隔符號) 直接回傳，不再爬取 iCook
+    #    快取沒有時，再看本地食材索引是否已有足夠的符合食譜
+    key = query_key(tokenize_query(q), SEARCH_LIMIT)
+    response = _cached_response(request, key, compact)
+    if response is None and _answer_from_index(key):
+        response = _cached_response(request, key, compact)
+    if response is not None:
+        return response
+
+    # 同時到達的相同查詢只會有一個實際爬取，其他請求等待並共用結果 (錯誤也會一併傳遞)
+    response_list = SEARCH_FLIGHT.do(key, lambda: _scrape_and_cache(q, key))
+
+    # 返回給 n8n 製作 Flex Message 的資料清單 (包含三個【完整】食譜)
+    return json_response(request, encode_json({"recipes": response_list}, compact=compact))
+
+
+def _cached_response(request, key, compact):
+    if compact:
+        bodies = SEARCH_CACHE.get_bodies(key)
+        if bodies is not None:
+            # 精簡格式：直接拼接快取中已編碼的食譜位元組
+            return json_response(request, encode_recipe_list(bodies))
+    else:
+        response_list = SEARCH_CACHE.get(key)
+        if response_list is not None:
+            return json_response(request, encode_json({"recipes": response_list}))
+    return None
+
+
+def _answer_from_index(key):
+    """
+    從本地食材索引找出仍在 RECIPE_CACHE 中的符合食譜；湊滿 limit 筆時記入 SEARCH_CACHE 並返回 True。
+    """
+    ingredients, limit = key
+    urls = []
+    dead = []
+    try:
+        for url in INGREDIENT_INDEX.search(ingredients):
+            if not RECIPE_CACHE.contains(url):  # 食譜內容已被淘汰或過期 (只檢查存在，不讀取內容)
+                dead.append(url)
+                continue
+            urls.append(url)
+            if len(urls) >= limit:
+                SEARCH_CACHE.set(key, urls)
+                return True
+        return False
+    finally:
+        INGREDIENT_INDEX.discard(dead)      # 順便從索引移除，下次不必再檢查
+
+
+def _scrape_and_cache(q, key):
     # 1. 執行爬蟲，獲取完整的原始資料 (三筆食譜的所有細節)
-    raw_results = search_recipes(q)
-    
+    #    iCook 搜尋頁失敗時只回傳已取得的部分結果，且不記入搜尋結果快取；一筆都沒有則回 502
+    try:
+        raw_results = search_recipes(q, limit=SEARCH_LIMIT)
+        search_complete = True
+    except UpstreamError as exc:
+        if not exc.recipes:
+            raise HTTPException(status_code=502, detail="Recipe search upstream is unavailable.")
+        raw_results = exc.recipes
+        search_complete = False
+
     # 準備回傳給 n8n 的清單
     response_list = []
+    complete_list = []                      # 步驟頁面完整抓到的食譜，只有這些才會存入快取與索引
     
     for r in raw_results:
         # 2. 清理並標準化這筆完整的食譜資料 (包含所有 title, url, steps, ingredients...)
-        cleaned = clean_recipe(r) 
+        with timed("clean_recipe"):
+            cleaned = clean_recipe(r)
         
         recipe_url = cleaned.get("original_url")
         if recipe_url:
-            # 3. 將【完整的】清理後資料存入快取 (這是記憶體的來源)
-            RECIPE_CACHE[recipe_url] = {
-                "data": cleaned,
-                "timestamp": time.time()
-            }
-            
-            # 4. **【重要修改】**：直接將完整的 cleaned 資料加入回傳清單
+            # 3. **【重要修改】**：直接將完整的 cleaned 資料加入回傳清單
             # 讓 n8n 收到所有細節 包括URL，用於製作 Flex Message 按鈕。
             response_list.append(cleaned)
-            
-    # 返回給 n8n 製作 Flex Message 的資料清單 (包含三個【完整】食譜)
-    formatted = json.dumps(
-        jsonable_encoder({"recipes": response_list}),
-        ensure_ascii=False,
-        indent=4
-    )
+            if r.get("complete"):
+                complete_list.append(cleaned)
+
+    # 4. 將【完整的】清理後資料一次批次存入快取 (這是記憶體的來源)
+    #    步驟頁面失敗或逾時的食譜不快取，下次查詢時會重新爬取
+    RECIPE_CACHE.set_many((r["original_url"], r) for r in complete_list)
+    INGREDIENT_INDEX.add_many(complete_list)
 
-    return Response(content=formatted, media_type="application/json")
+    # 5. 記錄這組食材的搜尋結果 (只存網址，內容已在 RECIPE_CACHE 中)；結果不完整時不記錄
+    if search_complete and len(complete_list) == len(response_list):
+        SEARCH_CACHE.set(key, [r["original_url"] for r in response_list])
+
+    return response_list
+
+
+# ----------------------------------------------------
+# 路由 1-1: GET /recipes/stream (串流版本的第一次搜尋 - NDJSON)
+# 每一行是一筆 JSON：步驟頁面一抓完就送出 {"type": "recipe", "index": 順序, "data": 食譜}，
+# 最後送出 {"type": "summary", ...}，讓 n8n 不必等最慢的步驟頁面就能開始製作 Flex Message。
+# ----------------------------------------------------
+@app.get("/recipes/stream")
+def stream_recipes(q: str):
+    key = query_key(tokenize_query(q), SEARCH_LIMIT)
+    return StreamingResponse(_stream_recipes(q, key), media_type="application/x-ndjson")
+
+
+def _ndjson_recipe(index, body):
+    # body 是快取中預先編碼好的精簡 JSON，直接拼接成一行，不需重新序列化
+    return b'{"type":"recipe","index":' + str(index).encode() + b',"data":' + body + b"}\n"
+
+
+def _stream_recipes(q, key):
+    started = time.monotonic()
+
+    # 搜尋結果已在快取中 (或本地食材索引已有足夠的食譜)：立即送出全部食譜
+    items = SEARCH_CACHE.get_body_items(key)
+    if items is None and _answer_from_index(key):
+        items = SEARCH_CACHE.get_body_items(key)
+    if items is not None:
+        for index, (_, body) in enumerate(items):
+            yield _ndjson_recipe(index, body)
+        # summary 的欄位與下方即時爬取的版本相同
+        yield encode_json({
+            "type": "summary",
+            "count": len(items),
+            "cached": True,
+            "complete": True,
+            "urls": [url for url, _ in items],
+            "elapsed_ms": round((time.monotonic() - started) * 1000),
+        }, compact=True) + b"\n"
+        return
+
+    # 串流無法與其他請求共用，因此不經過 SEARCH_FLIGHT；步驟頁面仍會依網址合併抓取
+    urls_by_index = {}
+    complete = True
+    try:
+        for index, r in iter_recipes(q, limit=SEARCH_LIMIT):
+            with timed("clean_recipe"):
+                cleaned = clean_recipe(r)
+            recipe_url = cleaned.get("original_url")
+            if not recipe_url:
+                continue
+            # 每筆完整的食譜一完成就存入快取，使用者點擊按鈕時即可查到
+            if r.get("complete"):
+                RECIPE_CACHE.set(recipe_url, cleaned)
+                INGREDIENT_INDEX.add(cleaned)
+            else:
+                complete = False
+            urls_by_index[index] = recipe_url
+            yield _ndjson_recipe(index, encode_recipe(cleaned))
+    except UpstreamError:
+        complete = False                    # 已送出的食譜照常保留，只是不記入搜尋結果快取
+
+    # 依搜尋結果的原始順序記錄這組食材的搜尋結果 (結果完整時才記錄)
+    urls = [urls_by_index[index] for index in sorted(urls_by_index)]
+    if complete:
+        SEARCH_CACHE.set(key, urls)
+
+    yield encode_json({
+        "type": "summary",
+        "count": len(urls),
+        "cached": False,
+        "complete": complete,
+        "urls": urls,
+        "elapsed_ms": round((time.monotonic() - started) * 1000),
+    }, compact=True) + b"\n"
 
 
 # ----------------------------------------------------
 # 路由 2: POST /recipe_details (第二次查詢快取 - 使用者點擊按鈕，查詢快取取得單一食譜詳情)
 # ----------------------------------------------------
 @app.post("/recipe_details")                        # 處理 POST 請求，專門用於查詢快取
-def get_full_details(payload: URLPayload):
+def get_full_details(payload: URLPayload, request: Request, compact: bool = RESPONSE_COMPACT):
     """
     接收 n8n 傳來的單一食譜 URL，從快取中回傳該食譜的所有詳細資訊。
+    回應附有 ETag；用戶端帶 If-None-Match 且內容未變時回傳 304。
     """
     url = payload.recipe_url                        # 從 POST 請求 Body 中提取 URL
     
-    # 1. 檢查快取
-    cached_item = RECIPE_CACHE.get(url)             # 嘗試使用 URL 從字典中查找數據
-
-    if cached_item:
-        # 檢查快取是否過期 (可選)
-        # if time.time() - cached_item["timestamp"] > CACHE_TTL_SECONDS:
-        #     del RECIPE_CACHE[url]
-        #     raise HTTPException(status_code=404, detail=f"Recipe details have expired.")
+    # 1. 檢查快取 (已過期的項目會在查詢時自動移除並視為找不到)
+    if compact:
+        body = RECIPE_CACHE.get_body(url)           # 精簡格式：直接取出預先編碼好的位元組
+    else:
+        full_recipe_data = RECIPE_CACHE.get(url)    # 嘗試使用 URL 從快取中查找數據
+        body = encode_json(full_recipe_data) if full_recipe_data else None
 
-        # 2. 從快取中直接取出完整的食譜資料
-        full_recipe_data = cached_item["data"] 
-        
-        # 3. 回傳這份包含所有細節 (title, image, ingredients, steps) 的資料給 n8n
-        formatted = json.dumps(
-            jsonable_encoder(full_recipe_data),
-            ensure_ascii=False,
-            indent=4
-        )
-        return Response(content=formatted, media_type="application/json")
+    if body:
+        # 2. 回傳這份包含所有細節 (title, image, ingredients, steps) 的資料給 n8n
+        return json_response(request, body)
         
     # 如果快取中找不到
     raise HTTPException(                             # 找不到則回傳 404 錯誤
         status_code=404, detail=f"Recipe details for {url} not found in cache.")
 
 
+# ----------------------------------------------------
+# 路由 3: GET /cache_stats (查看快取使用狀況)
+# ----------------------------------------------------
+@app.get("/cache_stats")
+def get_cache_stats():
+    return {
+        "recipes": RECIPE_CACHE.stats(),
+        "searches": SEARCH_CACHE.stats(),
+        "coalesced": {
+            "searches": SEARCH_FLIGHT.coalesced,
+            "steps": STEPS_FLIGHT.coalesced,
+        },
+        "index": INGREDIENT_INDEX.stats(),
+    }
+
+
+# ----------------------------------------------------
+# 路由 4: GET /metrics (各階段耗時：搜尋頁、步驟頁、清理、序列化、各路由)
+# ----------------------------------------------------
+@app.get("/metrics")
+def get_metrics():
+    return METRICS.snapshot()
+
+
 # 🔥 Railway(雲端部署平台) 必要的啟動入口
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
@@ -0,0 +1,95 @@
+# metrics.py
+# 各階段耗時統計：在 search_recipes、fetch_steps 與回應路徑中埋點，
+# 透過 GET /metrics 查看每個階段的次數、平均、最大值與 p50 / p95 / p99，找出線上時間花在哪裡。
+
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+SAMPLE_SIZE = 2048                      # 每個階段保留最近幾筆樣本用於計算百分位數
+
+
+def percentile(sorted_values, pct):
+    """已排序數列的百分位數 (最近排名法)；空數列返回 0。"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class _Stage:
+    __slots__ = ("count", "errors", "total", "max", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=SAMPLE_SIZE)
+
+
+class Metrics:
+    """執行緒安全的各階段耗時紀錄。"""
+
+    def __init__(self):
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, error=False):
+        with self._lock:
+            s = self._stages.get(stage)
+            if s is None:
+                s = self._stages[stage] = _Stage()
+            s.count += 1
+            s.errors += error
+            s.total += seconds
+            s.max = max(s.max, seconds)
+            s.samples.append(seconds)
+
+    @contextmanager
+    def timed(self, stage):
+        """
+        計時區塊，可當作 with 敘述或函數裝飾器使用：
+            with METRICS.timed("fetch_steps"): ...
+            @METRICS.timed("clean_recipe")
+        區塊內拋出例外時仍會記錄，並計入 errors。
+        """
+        started = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - started, error)
+
+    def snapshot(self):
+        """回傳所有階段的統計 (毫秒)。"""
+        with self._lock:
+            stages = {
+                name: (s.count, s.errors, s.total, s.max, sorted(s.samples))
+                for name, s in self._stages.items()
+            }
+        result = {}
+        for name, (count, errors, total, max_, samples) in sorted(stages.items()):
+            result[name] = {
+                "count": count,
+                "errors": errors,
+                "avg_ms": round(total / count * 1000, 2) if count else 0.0,
+                "max_ms": round(max_ * 1000, 2),
+                "p50_ms": round(percentile(samples, 50) * 1000, 2),
+                "p95_ms": round(percentile(samples, 95) * 1000, 2),
+                "p99_ms": round(percentile(samples, 99) * 1000, 2),
+            }
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+
+METRICS = Metrics()                     # 全域共用的統計物件
+timed = METRICS.timed
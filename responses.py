@@ -0,0 +1,115 @@
+# responses.py
+# HTTP 回應輔助模組：負責 JSON 編碼、強 ETag / If-None-Match (304) 以及 gzip / brotli 壓縮。
+# 快取中的食譜已預先編碼成精簡 (不縮排) 的 UTF-8 JSON 位元組，可直接拼接後回傳，
+# 不必每次請求都重新執行 jsonable_encoder + json.dumps。
+
+import gzip
+import hashlib
+import json
+from functools import lru_cache
+
+from fastapi import Response
+
+from metrics import timed
+
+try:                                    # brotli 為選用套件：沒有安裝時只提供 gzip
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_COMPRESS_BYTES = 1024               # 小於此大小的回應不壓縮 (壓縮效益低於 CPU 成本)
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+@timed("response.serialize")
+def encode_json(obj, compact=False):
+    """
+    將資料編碼成 UTF-8 JSON 位元組。
+    compact=False 時維持原本 indent=4 的可讀格式；compact=True 時不縮排、不留空白。
+    """
+    if compact:
+        text = json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+    else:
+        text = json.dumps(obj, ensure_ascii=False, indent=4)
+    return text.encode("utf-8")
+
+
+def encode_recipe_list(bodies):
+    """
+    將多筆已編碼 (精簡格式) 的食譜拼接成 {"recipes": [...]}，不需重新序列化。
+    """
+    return b'{"recipes":[' + b",".join(bodies) + b"]}"
+
+
+def make_etag(body, encoding=None):
+    """依內容計算強 ETag；有內容編碼時加上後綴 (-gzip / -br)，不同編碼的表示法需有不同的強 ETag。"""
+    tag = hashlib.blake2b(body, digest_size=16).hexdigest()
+    if encoding:
+        tag += "-" + encoding
+    return '"' + tag + '"'
+
+
+def _etag_matches(if_none_match, etag):
+    """
+    檢查 If-None-Match 是否包含此 ETag (弱比較：忽略 W/ 前綴)。
+    """
+    if not if_none_match:
+        return False
+    tag = etag.strip('"')
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        candidate = candidate.strip('"')
+        if candidate == tag:
+            return True
+    return False
+
+
+def _choose_encoding(accept_encoding):
+    """依 Accept-Encoding 選擇壓縮方式：優先 br (若已安裝)，其次 gzip，否則不壓縮。"""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        token, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(token.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+@lru_cache(maxsize=256)
+def _compress(body, encoding):
+    # 相同內容 (例如熱門食譜的詳情) 重複被請求時，直接重用壓縮結果
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def json_response(request, body):
+    """
+    回傳 JSON 位元組：附上強 ETag；若用戶端的 If-None-Match 相符則回 304；
+    並依 Accept-Encoding 協商 gzip / brotli 壓縮。
+    """
+    # 先協商壓縮方式，ETag 依此加上後綴，304 與 200 才會帶相同的 ETag
+    encoding = None
+    if len(body) >= MIN_COMPRESS_BYTES:
+        encoding = _choose_encoding(request.headers.get("accept-encoding"))
+    etag = make_etag(body, encoding)
+    headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    if encoding:
+        with timed("response.compress"):
+            body = _compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+
+    return Response(content=body, media_type="application/json", headers=headers)
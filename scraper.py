@@ -1,153 +1,281 @@
 #scraper.py
 #網頁爬蟲模組，專門負責與食譜網站互動，抓取所有食譜的詳細資料
 #  
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED  # 引入執行緒池，用於平行抓取步驟頁面
+
 import requests                        # 引入 requests 庫，用於發送 HTTP 請求（抓取網頁內容）
-from bs4 import BeautifulSoup          # 引入 BeautifulSoup 庫，用於解析 HTML 內容
+from requests.adapters import HTTPAdapter
+
+from extract import extract_cards, extract_steps, get_best_image_url, ICOOK_BASE_URL  # 引入 HTML 擷取模組（lxml，後備為 BeautifulSoup）
+from metrics import timed              # 引入各階段耗時統計
+
+from singleflight import SingleFlight  # 引入請求合併模組（同一網址同時只抓一次）
 
 HEADERS = {                            # 定義 HTTP 請求頭
     "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
                   "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 }                                      # User-Agent 是模擬瀏覽器身份，防止網站拒絕爬蟲存取
 
+# ----------------------------------------------------
+# 【連線池與平行抓取設定】
+# 所有請求共用同一個 Session，重複使用 keep-alive 連線，省去每次 TCP/TLS 握手。
+# ----------------------------------------------------
+EXPECTED_CONCURRENT_SEARCHES = 4       # 預期同時進行的搜尋數，用來決定執行緒池大小
+MAX_FETCHES_PER_SEARCH = 4             # 單一搜尋同時抓取步驟頁面的上限（避免一個搜尋佔滿執行緒池）
+MAX_CONCURRENT_FETCHES = EXPECTED_CONCURRENT_SEARCHES * MAX_FETCHES_PER_SEARCH  # 全部搜尋合計的上限（避免對 iCook 造成過大壓力）
+REQUEST_TIMEOUT = (3.05, 10)           # 單一請求的逾時設定：(連線逾時, 讀取逾時) 秒
+SEARCH_DEADLINE_SECONDS = 20           # 一次搜尋（含所有步驟頁面）的總時限
+MAX_SEARCH_PAGES = 5                   # 一次搜尋最多翻幾頁搜尋結果（找不到足夠的符合食譜時才會往下翻）
+SEARCH_PAGE_WORKERS = EXPECTED_CONCURRENT_SEARCHES  # 抓取搜尋結果頁用的執行緒數
+
 
-def get_best_image_url(img_tag):
+def _build_session():
     """
-    從 img 標籤中提取最佳圖片 URL，以應對懶載入和響應式圖片。
-    優先順序：srcset (抓取最大解析度) > data-src > src
+    建立共用的 HTTP Session，連線池大小與平行抓取上限一致。
     """
-    if not img_tag:
-        return ""                      # 如果沒有圖片標籤，則返回空字串
-    
-    # 1. 優先從 srcset 提取最大尺寸的 URL(用於響應式圖片)
-    srcset = img_tag.get("srcset")
-    if srcset:
-        try:
-            # 抓取 srcset 清單中的第一個 URL (通常解析度最高)
-            first_url_descriptor = srcset.split(",")[0].strip()
-            # 提取 URL 部分 (在空格之前)
-            return first_url_descriptor.split(" ")[0]
-        except IndexError:
-            # 如果解析 srcset 失敗，則嘗試其他屬性
-            pass
-
-    # 2. 次要嘗試 data-src (iCook 網站常用於懶載入)
-    data_src = img_tag.get("data-src")
-    if data_src:
-        return data_src
-        
-    # 3. 最後嘗試 src (可能是 Base64 透明圖，但作為後備)
-    return img_tag.get("src", "")
-
-
-def fetch_steps(url):
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=MAX_CONCURRENT_FETCHES,
+        pool_maxsize=MAX_CONCURRENT_FETCHES + SEARCH_PAGE_WORKERS,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(HEADERS)
+    return session
+
+
+SESSION = _build_session()                                          # 全域共用的連線池
+_FETCH_POOL = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_FETCHES)  # 全域共用的抓取執行緒池
+_PAGE_POOL = ThreadPoolExecutor(max_workers=SEARCH_PAGE_WORKERS)     # 搜尋結果頁專用，不必排在步驟頁面後面
+STEPS_FLIGHT = SingleFlight()                                       # 同一食譜網址的步驟頁面同時只抓一次
+
+
+class UpstreamError(Exception):
+    """
+    iCook 搜尋結果頁抓取失敗或逾時，搜尋結果可能不完整 (與「沒有符合的食譜」區分)。
+    recipes 為出錯前已取得的食譜 (可能為空)。
+    """
+
+    def __init__(self, message, recipes=()):
+        super().__init__(message)
+        self.recipes = list(recipes)
+
+
+def _get(url, timeout=REQUEST_TIMEOUT):
+    """
+    透過共用 Session 發送 GET 請求；逾時或連線錯誤時返回 None。
+    非 200 的回應照常返回，由呼叫端依狀態碼判斷 (例如翻頁超過最後一頁的 404 代表沒有更多結果)。
+    """
+    try:
+        return SESSION.get(url, timeout=timeout)
+    except requests.RequestException:
+        return None
+
+
+def _declared_encoding(resp):
+    """
+    只採用 Content-Type 標頭明確宣告的 charset；沒有宣告時返回 None，
+    交給解析器依 <meta charset> 判斷 (避免 requests 對 text/html 預設的 ISO-8859-1)。
+    """
+    content_type = resp.headers.get("content-type", "")
+    for param in content_type.split(";")[1:]:
+        name, _, value = param.strip().partition("=")
+        if name.lower() == "charset" and value:
+            return value.strip('"\'')
+    return None
+
+
+def fetch_steps(url, timeout=REQUEST_TIMEOUT):
     """
     抓取單道食譜的步驟列表，每個步驟包含：
     {
         "description": "文字", "image": "圖片網址或空字串"
     }
+    請求失敗時返回 None (與頁面上沒有步驟的 [] 區分)。
+    同一網址若已有請求正在抓取，會等待並共用該次的結果。
     """
-    resp = requests.get(url, headers=HEADERS)
-    # 這裡檢查是否成功取得內容是個好習慣
-    if resp.status_code != 200:             # 對單一食譜 URL 發送請求
-        return []                           # 請求失敗則返回空列表
-        
-    soup = BeautifulSoup(resp.text, "html.parser")
+    if not url:
+        return None
+    with timed("fetch_steps"):              # 含等待其他請求共用結果的時間
+        return STEPS_FLIGHT.do(url, lambda: _fetch_steps_uncached(url, timeout))
+
 
-    steps_list = []
+def _fetch_steps_uncached(url, timeout):
+    with timed("fetch_steps.download"):
+        resp = _get(url, timeout=timeout)   # 對單一食譜 URL 發送請求
+    if resp is None or resp.status_code != 200:
+        return None                         # 請求失敗
 
-    # 選擇所有步驟的 HTML 容器（根據網站的 CSS 類別）
-    step_containers = soup.select("figure.recipe-step-instruction")
-    for step in step_containers:
-        # 抓文字：使用 CSS 選擇器找到步驟描述
-        p_tag = step.select_one("figcaption.recipe-step-description > p.recipe-step-description-content")
-        text = p_tag.get_text(strip=True) if p_tag else ""
+    # 直接從原始位元組解析，只取出 figure.recipe-step-instruction 內的文字與圖片
+    with timed("fetch_steps.parse"):
+        return extract_steps(resp.content, _declared_encoding(resp))
 
-        # 抓圖片：使用 helper 函數來找到最佳圖片 URL
-        img_tag = step.select_one("a.recipe-step-cover > img")
-        img_url = get_best_image_url(img_tag) # 使用新的 helper 函數
 
-        steps_list.append({
-            "description": text,
-            "image": img_url
-        })
+def _get_search_page(url):
+    with timed("search_page.download"):
+        return _get(url)
+
+
+def tokenize_query(query: str):
+    """
+    多食材處理：雞肉 洋蔥 → ["雞肉","洋蔥"]（半形逗號與空白皆視為分隔符號）
+    """
+    return [q.strip() for q in query.replace(",", " ").split() if q.strip()]
 
-    return steps_list
 
+@timed("search_recipes")
 def search_recipes(query: str, limit=3):
     """
     主要功能：根據使用者輸入的食材，搜尋並抓取多筆食譜的所有詳細資訊。
     query: 使用者輸入的食材（可能是 1~多個）
     limit: 回傳幾筆
+    回傳的清單順序與搜尋結果頁面上的卡片順序相同。
+    步驟頁面抓取失敗或逾時的食譜 steps 為空且 complete 為 False，呼叫端不應快取。
+    搜尋結果頁抓取失敗或逾時時拋出 UpstreamError，已取得的食譜放在其 recipes 屬性。
     """
+    results = [None] * limit
+    count = 0
+    try:
+        for index, recipe in iter_recipes(query, limit=limit):
+            results[index] = recipe
+            count += 1
+    except UpstreamError as exc:
+        exc.recipes = results[:count]
+        raise
+    return results[:count]
+
 
-    # 多食材處理：雞肉 洋蔥 → ["雞肉","洋蔥"]
-    ingredients = [q.strip() for q in query.replace(",", " ").split() if q.strip()]
+def iter_recipes(query: str, limit=3):
+    """
+    search_recipes 的產生器版本：每當一道食譜的步驟頁面抓取完成，就立即產出 (index, recipe)。
+    index 為該食譜在搜尋結果中的順序 (0 起算)，產出順序則依步驟頁面完成的先後。
+
+    逐頁翻閱 iCook 搜尋結果，直到找到 limit 筆符合全部食材的卡片、沒有更多結果、
+    翻過 MAX_SEARCH_PAGES 頁或超過總時限為止。符合條件的卡片一找到就開始抓步驟頁面；
+    搜尋結果頁與步驟頁面在同一個等待迴圈中處理，等待下一頁時已完成的食譜也會立即產出。
+    每個搜尋同時最多抓取 MAX_FETCHES_PER_SEARCH 個步驟頁面，其餘排隊等待。
+    每道食譜帶有 complete 欄位：步驟頁面抓取失敗或超過時限時為 False。
+    還需要的搜尋結果頁抓取失敗或超過時限時，先產出已找到的食譜，最後拋出 UpstreamError。
+    """
+    deadline = time.monotonic() + SEARCH_DEADLINE_SECONDS
+
+    ingredients = tokenize_query(query)
 
     search_keyword = "+".join(ingredients)
-    search_url = f"https://icook.tw/search/{search_keyword}"
+    search_url = f"{ICOOK_BASE_URL}/search/{search_keyword}"
 
-    resp = requests.get(search_url, headers=HEADERS) # 發送搜尋請求
-    # 這裡檢查是否成功取得內容是個好習慣
-    if resp.status_code != 200:
-        return []
-        
-    soup = BeautifulSoup(resp.text, "html.parser")
+    def page_url(page):
+        return search_url if page == 1 else f"{search_url}?page={page}"
 
-    cards = soup.select(".browse-recipe-item")       # 選擇所有食譜卡片容器（搜尋結果列表）
+    cards = []
+    seen = set()                            # 不同頁面可能重複出現同一道食譜
+    step_futures = {}                       # 步驟頁面的 future → 卡片順序
+    pending = deque()                       # 等待抓取步驟頁面的卡片順序
+    page = 1
+    page_future = _PAGE_POOL.submit(_get_search_page, page_url(page))  # 發送搜尋請求
+    page_failed = False
+    try:
+        while page_future is not None or step_futures or pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            waiting = set(step_futures)
+            if page_future is not None:
+                waiting.add(page_future)
+            done, _ = wait(waiting, timeout=remaining, return_when=FIRST_COMPLETED)
 
-    results = []
+            for future in done:
+                if future is not page_future:
+                    index = step_futures.pop(future)
+                    steps = future.result()
+                    if steps is not None:
+                        cards[index]["steps"] = steps   # 將完整的步驟清單加入結果
+                        cards[index]["complete"] = True
+                    _submit_steps(cards, pending, step_futures)
+                    yield index, cards[index]
+                    continue
 
-# ----------------------- 抓取食譜基本資訊 -----------------------
-    for card in cards:
-        # -----------------------
-        # 抓標題
-        # -----------------------
-        title_tag = card.select_one(".browse-recipe-name")
-        title = title_tag.text.strip() if title_tag else ""
+                page_future = None
+                resp = future.result()
+                if resp is None or resp.status_code != 200:
+                    # 第 1 頁的 404 或之後頁面的 4xx 代表沒有 (更多) 結果；
+                    # 逾時、連線錯誤、5xx 等才是 iCook 失敗：不再往下翻，結果不完整
+                    if not _no_more_results(resp, page):
+                        page_failed = True
+                    continue
 
-        # -----------------------
-        # 抓網址
-        # -----------------------
-        link_tag = card.select_one("a")
-        url = (
-            "https://icook.tw" + link_tag["href"]
-            if link_tag and link_tag.has_attr("href")
-            else ""
-        )
+                # ----------------------- 抓取食譜基本資訊 (標題、網址、食材摘要、封面圖) -----------------------
+                with timed("search_page.parse"):
+                    page_cards = extract_cards(resp.content, _declared_encoding(resp))
+                if not page_cards:
+                    continue                # 沒有更多搜尋結果
 
-        # -----------------------
-        # 抓食材摘要（用於過濾或簡介）
-        # -----------------------
-        summary_tag = card.select_one(".browse-recipe-content-ingredient")
-        summary = summary_tag.text.strip() if summary_tag else ""
+                # 卡片的過濾只依賴摘要，因此步驟頁面只會為符合條件的卡片抓取
+                for card in _match_cards(page_cards, ingredients, seen):
+                    pending.append(len(cards))
+                    cards.append(card)
+                    if len(cards) >= limit:
+                        break
+                _submit_steps(cards, pending, step_futures)
 
-        # -----------------------
-        # 抓封面圖 URL (使用 helper 函數優化)
-        img_tag = card.select_one("img.browse-recipe-cover-img")
-        img_url = get_best_image_url(img_tag) # 使用新的 helper 函數
+                # 本頁不足 limit 筆時才抓取下一頁，避免付出用不到的頁面
+                if len(cards) < limit and page < MAX_SEARCH_PAGES:
+                    page += 1
+                    page_future = _PAGE_POOL.submit(_get_search_page, page_url(page))
+        if page_future is not None:
+            page_failed = True              # 超過總時限時仍在等待搜尋結果頁
+        # 超過總時限：剩下的食譜以空步驟產出 (complete 為 False)
+        leftovers = sorted([*step_futures.values(), *pending])
+    finally:
+        # 超過時限或呼叫端提早結束 (例如串流的用戶端斷線) 時，取消尚未開始的翻頁與步驟頁面，
+        # 不再佔用執行緒池與 iCook 的連線
+        if page_future is not None:
+            page_future.cancel()
+        for future in step_futures:
+            future.cancel()
+        pending.clear()
 
+    for index in leftovers:
+        yield index, cards[index]
+
+    if page_failed:
+        raise UpstreamError(f"iCook search for {search_keyword!r} failed after {len(cards)} recipes")
+
+
+def _no_more_results(resp, page):
+    """搜尋結果頁的非 200 回應是否代表「沒有 (更多) 結果」，而不是 iCook 抓取失敗。"""
+    if resp is None:
+        return False
+    status = resp.status_code
+    return status == 404 or (page > 1 and 400 <= status < 500)
+
+
+def _submit_steps(cards, pending, step_futures):
+    """在不超過 MAX_FETCHES_PER_SEARCH 的前提下，為排隊中的卡片送出步驟頁面的抓取。"""
+    while pending and len(step_futures) < MAX_FETCHES_PER_SEARCH:
+        index = pending.popleft()
+        step_futures[_FETCH_POOL.submit(fetch_steps, cards[index]["url"])] = index
+
+
+def _match_cards(page_cards, ingredients, seen):
+    """
+    依序產出本頁中尚未出現過、且食材摘要包含全部使用者輸入食材的卡片。
+    """
+    for card in page_cards:
+        if card["url"] in seen:
+            continue
+        seen.add(card["url"])
         # -----------------------
         # 食材過濾：確保包含全部使用者輸入的食材
         # -----------------------
         if ingredients:
-            if not all(ing in summary for ing in ingredients):
+            if not all(ing in card["ingredients"] for ing in ingredients):
                 continue
-
-        # ----------------------- 抓取步驟（核心）-----------------------
-        steps_list = fetch_steps(url) # 呼叫上面的函數，抓取該食譜的步驟詳情
-
-        results.append({
-            "title": title,
-            "url": url,
-            "image": img_url,
-            "ingredients": summary,
-            "steps": steps_list # 將完整的步驟清單加入結果
-        })
-
-        if len(results) >= limit:
-            break
-
-    return results
+        card["steps"] = []
+        card["complete"] = False            # 步驟頁面抓取成功後才改為 True
+        yield card
 
 
 # 範例使用
@@ -0,0 +1,64 @@
+# singleflight.py
+# 請求合併 (single-flight) 模組：同一個 Key 同時只會有一個實際執行中的爬取工作，
+# 其他同時到達的呼叫者會等待並共用同一份結果；若執行失敗，例外會傳給每一個等待者。
+# 用於群組聊天中同時送出相同食材查詢時，避免重複爬取 iCook 並耗盡 threadpool。
+
+import threading
+
+
+class _Call:
+    """一次執行中的工作：完成後透過 Event 通知所有等待者。"""
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    用法：
+        flight = SingleFlight()
+        result = flight.do(key, lambda: expensive_work())
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0                  # 共用他人結果 (沒有自己執行) 的次數
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            # 已有相同 Key 的工作在執行中 → 等待它完成並共用結果
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            # 先移除再通知，之後到達的請求會重新執行 (例如改查已寫入的快取)
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self):
+        """目前正在執行中的工作數量。"""
+        with self._lock:
+            return len(self._calls)
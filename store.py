@@ -0,0 +1,189 @@
+# store.py
+# 持久化食譜快取：以 SQLite (WAL 模式) 儲存清理後的食譜，
+# 讓快取在 Railway 重新部署 / 程式崩潰後仍然存在，並可由多個 uvicorn worker 共用。
+# 介面與 cache.RecipeCache 相同 (get / get_body / contains / set / delete / clear / stats)，可直接替換 RECIPE_CACHE。
+# 啟動時不會把資料載入記憶體，每次查詢都是以網址為主鍵的單筆讀取。
+
+import json
+import sqlite3
+import threading
+import time
+
+from cache import encode_recipe
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recipes (
+    url        TEXT PRIMARY KEY,
+    data       TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS recipes_expires_at ON recipes (expires_at);
+"""
+
+
+def connect(path):
+    """
+    開啟一條 SQLite 連線 (自動提交模式，交易以 BEGIN 明確開始)；ingredient_index 也共用同一個檔案與設定。
+    """
+    conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")      # 讀寫互不阻塞，適合多個 worker 同時存取
+    conn.execute("PRAGMA synchronous=NORMAL")    # WAL 模式下兼顧安全與寫入速度
+    conn.execute("PRAGMA busy_timeout=10000")    # 其他行程正在寫入時等待而非立刻失敗
+    return conn
+
+
+class SQLiteRecipeStore:
+    """
+    以 SQLite 檔案為後端、以食譜網址為 Key 的快取。
+    path:        資料庫檔案路徑 (多個 worker 指向同一個檔案即可共用)
+    max_entries: 最多保留幾筆 (清掃時刪除最早過期的多餘項目)
+    ttl:         每筆資料的有效秒數 (以 time.time() 紀錄，跨行程一致)
+    sweep_interval: 定期清除過期資料的間隔秒數 (在寫入時順便執行)
+    """
+
+    def __init__(self, path, max_entries=20000, ttl=3600, sweep_interval=60):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+
+        self._local = threading.local()     # sqlite3 連線不可跨執行緒共用 → 每個執行緒各自一條
+        self._stats_lock = threading.Lock()
+        self._next_sweep = time.monotonic() + sweep_interval
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+        return conn
+
+    def _count(self, name, n=1):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def __len__(self):
+        row = self._conn().execute("SELECT COUNT(*) FROM recipes").fetchone()
+        return row[0]
+
+    def __contains__(self, url):
+        return self.contains(url)
+
+    def contains(self, url):
+        """
+        只檢查食譜是否存在且未過期：不讀取內容、不計入命中統計。
+        """
+        row = self._conn().execute(
+            "SELECT 1 FROM recipes WHERE url = ? AND expires_at > ?", (url, time.time())
+        ).fetchone()
+        return row is not None
+
+    def get(self, url):
+        """
+        取得快取的食譜 (clean_recipe 格式)；不存在或已過期時返回 None。
+        """
+        data = self._lookup(url)
+        return json.loads(data) if data is not None else None
+
+    def get_body(self, url):
+        """
+        取得快取食譜的精簡 JSON 位元組 (資料庫內本來就是精簡格式，不需重新編碼)。
+        """
+        data = self._lookup(url)
+        return data.encode("utf-8") if data is not None else None
+
+    def _lookup(self, url):
+        row = self._conn().execute(
+            "SELECT data, expires_at FROM recipes WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+        data, expires_at = row
+        if expires_at <= time.time():
+            self.delete(url)                # 讀取時發現過期 → 直接移除
+            self._count("expirations")
+            self._count("misses")
+            return None
+        self._count("hits")
+        return data
+
+    def set(self, url, recipe):
+        """存入一筆清理後的食譜。"""
+        self.set_many([(url, recipe)])
+
+    def set_many(self, items):
+        """
+        在同一個交易中批次寫入多筆 (url, recipe)，一次搜尋的結果只需一次磁碟同步。
+        """
+        expires_at = time.time() + self.ttl
+        rows = [
+            (url, encode_recipe(recipe).decode("utf-8"), expires_at)
+            for url, recipe in items
+            if url
+        ]
+        if not rows:
+            return
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT OR REPLACE INTO recipes (url, data, expires_at) VALUES (?, ?, ?)", rows
+            )
+        self._maybe_sweep()
+
+    def delete(self, url):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM recipes WHERE url = ?", (url,))
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM recipes")
+
+    def stats(self):
+        """回傳快取的使用統計。"""
+        with self._stats_lock:
+            counters = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            **counters,
+        }
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self.sweep_interval
+
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            expired = conn.execute(
+                "DELETE FROM recipes WHERE expires_at <= ?", (time.time(),)
+            ).rowcount
+            # 超過筆數上限時，刪除最早過期 (也就是最早寫入) 的項目
+            overflow = conn.execute(
+                "DELETE FROM recipes WHERE url IN ("
+                " SELECT url FROM recipes ORDER BY expires_at"
+                " LIMIT max(0, (SELECT COUNT(*) FROM recipes) - ?))",
+                (self.max_entries,),
+            ).rowcount
+        self._count("expirations", expired)
+        self._count("evictions", overflow)